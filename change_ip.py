@@ -1,14 +1,122 @@
 #!/usr/bin/env python3
+import base64
+import functools
+import http.client
+import io
+import ipaddress
 import json
 import logging
-import re
+import random
+import socket
+import ssl
+import threading
 import time
+import urllib.error
+import urllib.parse
 import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from concurrent.futures import TimeoutError as FuturesTimeoutError
 from pathlib import Path
 
+try:
+    import orjson
+except ImportError:  # opzionale: senza orjson si usa il modulo json standard
+    orjson = None
+
 # Nome del file di configurazione (stessa cartella dello script)
 CONFIG_FILENAME = "change_ip_config.json"
 
+USER_AGENT = "change_ip.py"
+
+# Servizi che restituiscono l'IP pubblico in chiaro
+IP_SERVICES = (
+    "https://api.ipify.org",
+    "https://ifconfig.me/ip",
+    "https://checkip.amazonaws.com",
+)
+
+# Dimensione massima accettata per le risposte HTTP (difesa da server anomali)
+MAX_RESPONSE_BYTES = 1 << 20
+MAX_IP_RESPONSE_BYTES = 64
+
+# Tetto (in secondi) all'attesa tra un tentativo e l'altro verso Cloudflare
+RETRY_MAX_DELAY = 60
+
+# Validità (in secondi) del record Cloudflare memorizzato tra un ciclo e l'altro
+RECORD_CACHE_TTL = 3600
+
+# Codici HTTP transitori: per gli altri (es. 400, 401, 403) ritentare è inutile
+RETRIABLE_HTTP_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+# Schema della configurazione: chiave -> (tipi ammessi, obbligatoria, valore minimo)
+CONFIG_SCHEMA = {
+    "cloudflare_api_token": (str, True, None),
+    "zone_id": (str, True, None),
+    "record_name": (str, True, None),
+    "check_interval": ((int, float), False, 1),
+    "max_retries": (int, False, 1),
+    "retry_delay": ((int, float), False, 0),
+    "log_level": (str, False, None),
+    "telegram_bot_token": (str, False, None),
+    "telegram_chat_ids": (list, False, None),
+}
+
+# Thread per le richieste HTTP in parallelo (servizi IP, Telegram), creati una
+# sola volta e riusati ad ogni ciclo
+IO_MAX_WORKERS = 8
+_io_executor = ThreadPoolExecutor(max_workers=IO_MAX_WORKERS, thread_name_prefix="change_ip")
+
+# Connessioni HTTPS keep-alive inattive, raggruppate per host, riusate tra i cicli
+POOL_MAXSIZE = 4
+
+# Keepalive TCP sui socket del pool: peer morto rilevato in 10 + 5 * 3 = 25 secondi
+TCP_KEEPALIVE_IDLE = 10
+TCP_KEEPALIVE_INTERVAL = 5
+TCP_KEEPALIVE_COUNT = 3
+_pool: dict[str, list[http.client.HTTPSConnection]] = {}
+_pool_lock = threading.Lock()
+
+# Serializzazione JSON: orjson (se installato) lavora direttamente su bytes
+if orjson is not None:
+    json_dumps = orjson.dumps
+    json_loads = orjson.loads
+else:
+    def json_dumps(data) -> bytes:
+        return json.dumps(data).encode("utf-8")
+
+    json_loads = json.loads  # accetta anche bytes UTF-8
+
+# Ultimo record A letto da Cloudflare e relativo ETag, per le richieste condizionali
+_cf_record_cache: dict = {}
+
+
+def validate_config(cfg: dict):
+    """Controlla la configurazione contro CONFIG_SCHEMA, riportando tutti gli errori insieme."""
+    errors = []
+    for key, (types, required, minimum) in CONFIG_SCHEMA.items():
+        value = cfg.get(key)
+        if value is None or value == "":
+            if required:
+                errors.append(f"chiave obbligatoria mancante '{key}'")
+            continue
+        # bool è una sottoclasse di int, ma true/false non sono numeri validi qui
+        if isinstance(value, bool) or not isinstance(value, types):
+            errors.append(f"'{key}' ha un tipo non valido ({type(value).__name__})")
+        elif minimum is not None and value < minimum:
+            errors.append(f"'{key}' deve essere almeno {minimum}")
+
+    chat_ids = cfg.get("telegram_chat_ids") or []
+    if isinstance(chat_ids, list):
+        for x in chat_ids:
+            # Ammessi interi o stringhe numeriche (gli ID dei gruppi sono negativi)
+            if isinstance(x, bool) or not isinstance(x, (int, str)) or (
+                isinstance(x, str) and not x.strip().removeprefix("-").isdecimal()
+            ):
+                errors.append(f"'telegram_chat_ids' contiene un ID non valido: {x!r}")
+
+    if errors:
+        raise ValueError(f"File di config non valido: {'; '.join(errors)}")
+
 
 def load_config():
     """Carica la configurazione da file JSON e applica i default."""
@@ -20,8 +128,11 @@ def load_config():
             f"Crealo a partire da change_ip_config.json di esempio."
         )
 
-    with config_path.open("r", encoding="utf-8") as f:
-        raw = json.load(f)
+    raw = json_loads(config_path.read_bytes())
+    if not isinstance(raw, dict):
+        raise ValueError(
+            f"File di config non valido: atteso un oggetto JSON, trovato {type(raw).__name__}"
+        )
 
     # Valori di default
     defaults = {
@@ -31,18 +142,27 @@ def load_config():
         "log_level": "INFO",
     }
 
-    cfg = {**defaults, **raw}
+    # null e "" valgono come chiave assente: si applica il default (o l'errore se obbligatoria)
+    cfg = {**defaults, **{k: v for k, v in raw.items() if v is not None and v != ""}}
 
-    # Chiavi obbligatorie
-    required_keys = ["cloudflare_api_token", "zone_id", "record_name"]
-    for key in required_keys:
-        if not cfg.get(key):
-            raise ValueError(f"Chiave obbligatoria mancante nel file di config: '{key}'")
+    validate_config(cfg)
 
     # Normalizza lista chat Telegram (può essere lista di int o stringhe)
     chat_ids = cfg.get("telegram_chat_ids") or []
     cfg["telegram_chat_ids"] = [int(x) for x in chat_ids]
 
+    # Valori derivati, calcolati una sola volta e riusati ad ogni richiesta
+    cf_base = f"https://api.cloudflare.com/client/v4/zones/{cfg['zone_id']}/dns_records"
+    cfg["_cf_headers"] = {
+        "Authorization": f"Bearer {cfg['cloudflare_api_token']}",
+        "Content-Type": "application/json",
+    }
+    # Serve solo il primo record: per_page=5 (minimo ammesso) limita il body
+    cfg["_cf_list_url"] = f"{cf_base}?name={cfg['record_name']}&type=A&per_page=5"
+    cfg["_cf_record_url_template"] = f"{cf_base}/{{}}"
+    bot_token = cfg.get("telegram_bot_token")
+    cfg["_tg_url"] = f"https://api.telegram.org/bot{bot_token}/sendMessage" if bot_token else None
+
     return cfg
 
 
@@ -54,97 +174,320 @@ def setup_logging(level_name: str):
     )
 
 
-def is_valid_public_ipv4(ip: str) -> bool:
-    """Verifica se l'IP è un IPv4 pubblico valido (molto basic)."""
-    if not re.match(r"^(\d{1,3}\.){3}\d{1,3}$", ip):
-        return False
+class _PooledHTTPSConnection(http.client.HTTPSConnection):
+    """Connessione HTTPS del pool con keepalive TCP (TCP_NODELAY lo imposta già http.client).
+
+    I probe partono dopo TCP_KEEPALIVE_IDLE secondi di inattività, quindi entro un
+    intervallo di polling (il default Linux sarebbe 7200s): il mapping NAT resta
+    aperto e, se il peer è sparito, il kernel chiude il socket con un errore che
+    _acquire_connection rileva (SO_ERROR) scartando la connessione prima del riuso.
+    """
 
-    octets = ip.split(".")
+    def connect(self):
+        super().connect()
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        # Opzioni non disponibili su tutte le piattaforme
+        if hasattr(socket, "TCP_KEEPIDLE"):
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, TCP_KEEPALIVE_IDLE)
+        if hasattr(socket, "TCP_KEEPINTVL"):
+            self.sock.setsockopt(
+                socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, TCP_KEEPALIVE_INTERVAL
+            )
+        if hasattr(socket, "TCP_KEEPCNT"):
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, TCP_KEEPALIVE_COUNT)
+
+
+def _socket_error(sock) -> int:
+    """Errore pendente sul socket (SO_ERROR), 0 se il socket è ancora sano."""
     try:
-        octets_int = [int(o) for o in octets]
-    except ValueError:
-        return False
+        return sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+    except OSError as e:
+        return e.errno or -1
+
+
+def _acquire_connection(host: str, timeout: float):
+    """Preleva una connessione inattiva dal pool (o ne crea una nuova)."""
+    with _pool_lock:
+        idle = _pool.get(host) or []
+        while idle:
+            conn = idle.pop()
+            if conn.sock is not None:
+                if _socket_error(conn.sock):
+                    # Socket già chiuso dal kernel (es. probe keepalive falliti): scarta
+                    conn.close()
+                    continue
+                conn.sock.settimeout(timeout)
+            return conn, True
+    return _new_connection(host, timeout), False
+
+
+def _new_connection(host: str, timeout: float) -> http.client.HTTPSConnection:
+    """Crea una connessione verso l'host, via tunnel CONNECT se è impostato HTTPS_PROXY."""
+    proxy = urllib.request.getproxies().get("https")
+    if not proxy or urllib.request.proxy_bypass(host):
+        return _PooledHTTPSConnection(host, timeout=timeout)
+
+    if "://" not in proxy:
+        proxy = f"http://{proxy}"
+    parts = urllib.parse.urlsplit(proxy)
+    tunnel_headers = {}
+    if parts.username:
+        user = urllib.parse.unquote(parts.username)
+        password = urllib.parse.unquote(parts.password or "")
+        token = base64.b64encode(f"{user}:{password}".encode("utf-8")).decode("ascii")
+        tunnel_headers["Proxy-Authorization"] = f"Basic {token}"
+    conn = _PooledHTTPSConnection(parts.hostname, parts.port, timeout=timeout)
+    conn.set_tunnel(host, headers=tunnel_headers)
+    return conn
+
+
+def _release_connection(host: str, conn: http.client.HTTPSConnection):
+    """Rimette la connessione nel pool, oppure la chiude se il pool è pieno."""
+    with _pool_lock:
+        idle = _pool.setdefault(host, [])
+        if len(idle) < POOL_MAXSIZE:
+            idle.append(conn)
+            return
+    conn.close()
+
+
+@functools.lru_cache(maxsize=32)
+def _split_url(url: str) -> tuple[str, str]:
+    """Host e path di un URL; gli URL usati sono pochi e fissi, quindi si memorizzano."""
+    parts = urllib.parse.urlsplit(url)
+    path = parts.path or "/"
+    if parts.query:
+        path = f"{path}?{parts.query}"
+    return parts.netloc, path
+
+
+def https_request(
+    url: str,
+    method: str = "GET",
+    body: bytes | None = None,
+    headers: dict | None = None,
+    timeout: float = 10,
+    max_bytes: int = MAX_RESPONSE_BYTES,
+):
+    """Richiesta HTTPS su connessione keep-alive riusata: restituisce (status, headers, body).
+
+    Come urllib, solleva urllib.error.HTTPError per status >= 400; a differenza di
+    urllib non segue i redirect, quindi anche i 3xx (tranne 304) sono errori.
+    Legge al più `max_bytes` byte di risposta e solleva RuntimeError se il body
+    è più lungo. Rispetta HTTPS_PROXY / NO_PROXY come urllib.
+    """
+    host, path = _split_url(url)
+    req_headers = {"User-Agent": USER_AGENT, **(headers or {})}
 
-    # Range numerici validi
-    if any(o < 0 or o > 255 for o in octets_int):
-        return False
+    while True:
+        conn, reused = _acquire_connection(host, timeout)
+        try:
+            conn.request(method, path, body=body, headers=req_headers)
+            response = conn.getresponse()
+            content = response.read(max_bytes + 1)
+            # Con transfer chunked read(n) può fermarsi prima della fine del body
+            while len(content) <= max_bytes and not response.isclosed():
+                chunk = response.read(max_bytes + 1 - len(content))
+                if not chunk:
+                    break
+                content += chunk
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            conn.close()
+            if reused:
+                # Connessione keep-alive chiusa dal server nel frattempo: riprova
+                continue
+            raise
+        except Exception:
+            conn.close()
+            raise
+        break
+
+    if len(content) > max_bytes:
+        # Body non letto per intero: la connessione non è riutilizzabile
+        conn.close()
+        raise RuntimeError(f"Risposta da {url} troppo grande (oltre {max_bytes} byte)")
+
+    if response.will_close:
+        conn.close()
+    else:
+        _release_connection(host, conn)
+
+    if response.status >= 400 or (300 <= response.status < 400 and response.status != 304):
+        raise urllib.error.HTTPError(
+            url, response.status, response.reason, response.headers, io.BytesIO(content)
+        )
+    return response.status, response.headers, content
 
-    o1, o2, _, _ = octets_int
 
-    # Escludi private e loopback principali (10.x, 127.x, 172.16-31.x, 192.168.x)
-    if o1 in (10, 127):
-        return False
-    if o1 == 172 and 16 <= o2 <= 31:
-        return False
-    if o1 == 192 and o2 == 168:
+def is_valid_public_ipv4(ip: str) -> bool:
+    """Verifica se l'IP è un IPv4 pubblico valido (globalmente instradabile, non multicast)."""
+    try:
+        addr = ipaddress.IPv4Address(ip)
+    except ValueError:
         return False
 
-    return True
+    # is_global esclude private, loopback, link-local, CGNAT (100.64/10), riservati, ecc.
+    return addr.is_global and not addr.is_multicast
 
 
 def get_current_ip() -> str:
     """Ottiene l'IP pubblico corrente usando più servizi."""
-    methods = [
-        ("https://api.ipify.org", lambda r: r.decode("utf-8").strip()),
-        ("https://ifconfig.me/ip", lambda r: r.decode("utf-8").strip()),
-        ("https://checkip.amazonaws.com", lambda r: r.decode("utf-8").strip()),
-    ]
+    errors = []
 
-    last_error = None
-
-    for url, parser in methods:
+    # Interroga tutti i servizi in parallelo e usa la prima risposta valida
+    futures = {}
+    try:
+        futures = {
+            _io_executor.submit(
+                https_request, url, timeout=10, max_bytes=MAX_IP_RESPONSE_BYTES
+            ): url
+            for url in IP_SERVICES
+        }
         try:
-            with urllib.request.urlopen(url, timeout=10) as response:
-                ip = parser(response.read())
+            for future in as_completed(futures, timeout=10):
+                url = futures[future]
+                try:
+                    _, _, content = future.result()
+                    ip = content.decode("ascii", "ignore").strip()
+                except Exception as e:
+                    logging.warning(f"Errore nel recupero dell'IP da {url}: {e}")
+                    errors.append(f"{url}: {e}")
+                    continue
+
                 if is_valid_public_ipv4(ip):
                     logging.debug(f"IP ottenuto da {url}: {ip}")
                     return ip
-                else:
-                    logging.warning(f"Risposta da {url} non è un IP pubblico valido: '{ip}'")
-        except Exception as e:
-            logging.warning(f"Errore nel recupero dell'IP da {url}: {e}")
-            last_error = e
+                logging.warning(f"Risposta da {url} non è un IP pubblico valido: '{ip}'")
+                errors.append(f"{url}: risposta non valida '{ip}'")
+        except FuturesTimeoutError:
+            errors.append("timeout in attesa dei servizi")
+    finally:
+        # Non attende le richieste ancora in corso
+        for future in futures:
+            future.cancel()
+
+    raise RuntimeError(
+        f"Impossibile ottenere un indirizzo IP pubblico valido: {'; '.join(errors)}"
+    )
 
-    raise RuntimeError(f"Impossibile ottenere un indirizzo IP pubblico valido: {last_error}")
 
+class CircuitOpenError(RuntimeError):
+    """Chiamata rifiutata localmente perché il circuit breaker è aperto."""
 
-def cloudflare_request(cfg, method: str, url: str, data: dict | None = None) -> dict:
-    """Effettua una richiesta all'API Cloudflare (TLS verificato)."""
-    headers = {
-        "Authorization": f"Bearer {cfg['cloudflare_api_token']}",
-        "Content-Type": "application/json",
-    }
 
-    req = urllib.request.Request(url, headers=headers, method=method)
-    if data is not None:
-        req.data = json.dumps(data).encode("utf-8")
+class CircuitBreaker:
+    """Circuit breaker CLOSED → OPEN → HALF_OPEN per le chiamate a Cloudflare.
+
+    Dopo `threshold` errori transitori consecutivi le chiamate falliscono subito
+    per `recovery` secondi; poi una sola chiamata di prova decide se richiudere.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, threshold: int = 5, recovery: float = 120):
+        self.threshold = threshold
+        self.recovery = recovery
+        self.state = self.CLOSED
+        self.failure_count = 0
+        self.opened_at = 0.0
+
+    def before_call(self):
+        if self.state != self.OPEN:
+            return
+        remaining = self.recovery - (time.monotonic() - self.opened_at)
+        if remaining > 0:
+            raise CircuitOpenError(
+                f"Cloudflare non raggiungibile, chiamate sospese per altri {remaining:.0f} secondi"
+            )
+        logging.info("Circuit breaker Cloudflare semi-aperto, provo una richiesta.")
+        self.state = self.HALF_OPEN
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logging.info("Circuit breaker Cloudflare chiuso, API di nuovo raggiungibile.")
+        self.state = self.CLOSED
+        self.failure_count = 0
+
+    def record_failure(self):
+        self.failure_count += 1
+        if self.state == self.HALF_OPEN or self.failure_count >= self.threshold:
+            logging.warning(
+                f"Circuit breaker Cloudflare aperto dopo {self.failure_count} errori, "
+                f"pausa di {self.recovery} secondi."
+            )
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
 
-    with urllib.request.urlopen(req, timeout=15) as response:
-        body = response.read().decode("utf-8")
-        return json.loads(body)
+_cf_breaker = CircuitBreaker()
+
+
+def cloudflare_request(
+    cfg, method: str, url: str, data: dict | None = None, cache: dict | None = None
+) -> dict | None:
+    """Effettua una richiesta all'API Cloudflare (TLS verificato).
+
+    Se viene passato `cache`, la richiesta è condizionale (If-None-Match sull'ETag
+    salvato) e restituisce None quando Cloudflare risponde 304 Not Modified.
+    """
+    headers = cfg["_cf_headers"]
+    if cache and cache.get("etag"):
+        headers = {**headers, "If-None-Match": cache["etag"]}
+
+    body = json_dumps(data) if data is not None else None
+
+    _cf_breaker.before_call()
+    try:
+        status, resp_headers, content = https_request(url, method, body, headers, timeout=15)
+    except Exception as e:
+        # Solo gli errori transitori indicano un'API non disponibile
+        if is_retriable_error(e):
+            _cf_breaker.record_failure()
+        else:
+            _cf_breaker.record_success()
+        raise
+    _cf_breaker.record_success()
+
+    if status == 304:
+        return None
+    if cache is not None:
+        cache["etag"] = resp_headers.get("ETag")
+    return json_loads(content)
 
 
 def get_cloudflare_record(cfg):
     """Recupera ID, IP e stato proxy del record A su Cloudflare."""
-    url = (
-        f"https://api.cloudflare.com/client/v4/zones/"
-        f"{cfg['zone_id']}/dns_records?name={cfg['record_name']}&type=A"
-    )
-    data = cloudflare_request(cfg, "GET", url)
+    data = cloudflare_request(cfg, "GET", cfg["_cf_list_url"], cache=_cf_record_cache)
+
+    if data is None and "record" in _cf_record_cache:
+        logging.debug("Record Cloudflare invariato (304), uso la copia in cache.")
+        _cf_record_cache["ts"] = time.monotonic()
+        return _cf_record_cache["record"]
 
-    if data.get("success") and data.get("result"):
+    if data and data.get("success") and data.get("result"):
         rec = data["result"][0]
-        return rec["id"], rec["content"], rec["proxied"]
+        _cf_record_cache["record"] = rec["id"], rec["content"], rec["proxied"]
+        _cf_record_cache["ts"] = time.monotonic()
+        return _cf_record_cache["record"]
 
+    _cf_record_cache.clear()
     raise RuntimeError("Record DNS A non trovato su Cloudflare")
 
 
+def get_cached_cloudflare_record():
+    """Record A memorizzato nei cicli precedenti, se più recente di RECORD_CACHE_TTL."""
+    if "record" not in _cf_record_cache:
+        return None
+    if time.monotonic() - _cf_record_cache["ts"] > RECORD_CACHE_TTL:
+        return None
+    return _cf_record_cache["record"]
+
+
 def update_cloudflare_dns(cfg, record_id: str, ip: str, proxied: bool) -> bool:
     """Aggiorna il record A con il nuovo IP e impostazione proxy."""
-    url = (
-        f"https://api.cloudflare.com/client/v4/zones/"
-        f"{cfg['zone_id']}/dns_records/{record_id}"
-    )
+    url = cfg["_cf_record_url_template"].format(record_id)
     payload = {
         "type": "A",
         "name": cfg["record_name"],
@@ -153,43 +496,73 @@ def update_cloudflare_dns(cfg, record_id: str, ip: str, proxied: bool) -> bool:
         "proxied": proxied,
     }
     resp = cloudflare_request(cfg, "PUT", url, payload)
-    return bool(resp.get("success"))
+    success = bool(resp.get("success"))
+    if success:
+        # Il record ora è noto: il prossimo cambio IP può saltare la GET.
+        # L'ETag precedente non corrisponde più al contenuto aggiornato.
+        _cf_record_cache.update(
+            record=(record_id, ip, proxied), ts=time.monotonic(), etag=None
+        )
+    else:
+        _cf_record_cache.clear()
+    return success
+
+
+def is_retriable_error(exc: Exception) -> bool:
+    """True se l'errore è transitorio (timeout, rete, 429/5xx) e ha senso ritentare."""
+    if isinstance(exc, urllib.error.HTTPError):
+        return exc.code in RETRIABLE_HTTP_CODES
+    # Certificato non valido (CA mancante, proxy che intercetta TLS): ritentare non serve
+    if isinstance(exc, (ssl.SSLCertVerificationError, ssl.CertificateError)):
+        return False
+    return isinstance(exc, (OSError, http.client.HTTPException))
+
+
+def backoff_delay(base: float, attempt: int) -> float:
+    """Attesa prima del prossimo tentativo: backoff esponenziale con full jitter."""
+    return random.uniform(0, min(RETRY_MAX_DELAY, base * 2 ** (attempt - 1)))
+
+
+def _send_telegram_to_chat(cfg, chat_id: int, message: str):
+    """Invia il messaggio a una singola chat Telegram."""
+    payload = {
+        "chat_id": chat_id,
+        "text": message,
+    }
+    try:
+        status, _, content = https_request(
+            cfg["_tg_url"],
+            "POST",
+            json_dumps(payload),
+            {"Content-Type": "application/json"},
+            timeout=10,
+        )
+        if status == 200:
+            logging.info(f"Messaggio Telegram inviato a chat {chat_id}")
+        else:
+            logging.error(
+                f"Invio messaggio Telegram fallito per chat {chat_id}: "
+                f"{status} {content.decode('utf-8', 'replace')}"
+            )
+    except Exception as e:
+        logging.error(f"Errore nell'invio del messaggio Telegram a {chat_id}: {e}")
 
 
 def send_telegram_message(cfg, message: str):
     """Invia un messaggio Telegram a tutte le chat configurate (se configurato)."""
-    bot_token = cfg.get("telegram_bot_token")
     chat_ids = cfg.get("telegram_chat_ids") or []
 
-    if not bot_token or not chat_ids:
+    if not cfg.get("_tg_url") or not chat_ids:
         # Telegram opzionale: se non configurato, non fa nulla.
         logging.debug("Telegram non configurato, salto invio messaggio.")
         return
 
-    url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-
-    for chat_id in chat_ids:
-        payload = {
-            "chat_id": chat_id,
-            "text": message,
-        }
-        req = urllib.request.Request(
-            url,
-            data=json.dumps(payload).encode("utf-8"),
-            headers={"Content-Type": "application/json"},
-        )
-        try:
-            with urllib.request.urlopen(req, timeout=10) as response:
-                if response.getcode() == 200:
-                    logging.info(f"Messaggio Telegram inviato a chat {chat_id}")
-                else:
-                    content = response.read().decode("utf-8")
-                    logging.error(
-                        f"Invio messaggio Telegram fallito per chat {chat_id}: "
-                        f"{response.getcode()} {content}"
-                    )
-        except Exception as e:
-            logging.error(f"Errore nell'invio del messaggio Telegram a {chat_id}: {e}")
+    # Invii in parallelo: una chat lenta non ritarda le altre
+    futures = [
+        _io_executor.submit(_send_telegram_to_chat, cfg, chat_id, message)
+        for chat_id in chat_ids
+    ]
+    wait(futures)
 
 
 def main():
@@ -200,6 +573,8 @@ def main():
     logging.info(f"Intervallo controllo: {cfg['check_interval']} secondi")
 
     last_ip = None
+    interval = cfg["check_interval"]
+    next_tick = time.monotonic()
 
     while True:
         try:
@@ -209,12 +584,23 @@ def main():
                 logging.info(f"IP rilevato: {current_ip} (precedente: {last_ip})")
 
                 # tenta update Cloudflare con retry
-                for attempt in range(1, cfg["max_retries"] + 1):
+                attempt = 1
+                while attempt <= cfg["max_retries"]:
+                    from_cache = False
                     try:
-                        record_id, cf_ip, cf_proxied = get_cloudflare_record(cfg)
-                        logging.info(
-                            f"Record Cloudflare attuale: {cf_ip}, proxied={cf_proxied}"
-                        )
+                        # Se la cache dice già che serve un update, salta la GET
+                        cached = get_cached_cloudflare_record()
+                        if cached and (current_ip != cached[1] or cached[2]):
+                            record_id, cf_ip, cf_proxied = cached
+                            from_cache = True
+                            logging.info(
+                                f"Record Cloudflare in cache: {cf_ip}, proxied={cf_proxied}"
+                            )
+                        else:
+                            record_id, cf_ip, cf_proxied = get_cloudflare_record(cfg)
+                            logging.info(
+                                f"Record Cloudflare attuale: {cf_ip}, proxied={cf_proxied}"
+                            )
 
                         if current_ip != cf_ip or cf_proxied:
                             logging.info(
@@ -241,26 +627,48 @@ def main():
                             break
 
                     except Exception as e:
+                        # La cache potrebbe essere obsoleta (es. record rimosso): rileggi
+                        _cf_record_cache.clear()
+                        if from_cache and isinstance(e, urllib.error.HTTPError):
+                            # Rileggi subito il record, senza consumare un tentativo
+                            logging.warning(
+                                f"Update dal record in cache fallito ({e}), "
+                                f"rileggo il record da Cloudflare."
+                            )
+                            continue
                         logging.error(
                             f"Tentativo {attempt}/{cfg['max_retries']} fallito: {e}"
                         )
-                        if attempt < cfg["max_retries"]:
-                            logging.info(
-                                f"Riprovo tra {cfg['retry_delay']} secondi..."
+                        if not is_retriable_error(e):
+                            logging.error(
+                                "Errore non recuperabile, nessun nuovo tentativo fino al prossimo ciclo."
                             )
-                            time.sleep(cfg["retry_delay"])
+                            break
+                        if attempt < cfg["max_retries"]:
+                            delay = backoff_delay(cfg["retry_delay"], attempt)
+                            logging.info(f"Riprovo tra {delay:.1f} secondi...")
+                            time.sleep(delay)
                         else:
                             logging.error(
                                 "Numero massimo di tentativi raggiunto, rinuncio fino al prossimo ciclo."
                             )
 
+                    attempt += 1
+
             else:
                 logging.debug("IP invariato, nessuna azione.")
 
         except Exception as e:
             logging.error(f"Errore nel ciclo principale: {e}")
 
-        time.sleep(cfg["check_interval"])
+        # Cadenza fissa sull'orologio monotono: un ciclo lento non allunga l'intervallo
+        next_tick += interval
+        now = time.monotonic()
+        if now - next_tick > interval:
+            missed = int((now - next_tick) // interval)
+            logging.warning(f"Ciclo in ritardo, salto {missed} controlli.")
+            next_tick += missed * interval
+        time.sleep(max(0.0, next_tick - now))
 
 
 if __name__ == "__main__":